@@ -1,16 +1,13 @@
+import sys
 from datetime import datetime, timedelta
 from airflow import DAG
-from airflow.operators.bash import BashOperator
+from airflow.decorators import task
 from pathlib import Path
 
 DAGS_DIR = Path(__file__).parent
 PROJECT_ROOT = DAGS_DIR.parent
 SCRIPTS_DIR = DAGS_DIR.parent / "scripts"
 
-ingest_path = str(SCRIPTS_DIR / "ingest_hourly.py")
-transform_path = str(SCRIPTS_DIR / "transform.py")
-load_path = str(SCRIPTS_DIR / "load_to_db.py")
-
 default_args = {
 	"owner": "you",
 	"depends_on_past": False,
@@ -30,19 +27,21 @@ with DAG(
 	tags=["finance", "etfs", "stocks"]
 ) as dag:
 
-	ingest_daily = BashOperator(
-		task_id="ingest_hourly",
-		bash_command=f"python '{ingest_path}'"
-	)
+	@task(task_id="ingest_transform_load")
+	def ingest_transform_load():
+		"""Run ingest >> transform >> load in one interpreter so imports are paid once."""
+		if str(SCRIPTS_DIR) not in sys.path:
+			sys.path.insert(0, str(SCRIPTS_DIR))
 
-	transform = BashOperator(
-		task_id="transform_data",
-		bash_command=f"python '{transform_path}'"
-	)
+		# imported here so DAG parsing stays light
+		import migrate
+		import ingest_hourly
+		import transform
+		import load_stock_metrics
 
-	load = BashOperator(
-		task_id="load_data",
-		bash_command=f"python '{load_path}'"
-	)
+		migrate.main()
+		ingest_hourly.main()
+		transform.main()
+		load_stock_metrics.main()
 
-	ingest_daily >> transform >> load
\ No newline at end of file
+	ingest_transform_load()
@@ -2,104 +2,166 @@ import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
+import numpy as np
+import connectorx as cx
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from datetime import datetime, timedelta
+from sqlalchemy import create_engine, text
+from datetime import date, datetime, timedelta
+from functools import cache
+import hashlib
 import os
 
 # -----------------
 # CONFIG
 # -----------------
-from config import STOCK_TABLE, TIME_ZONE
+from config import STOCK_TABLE, TIME_ZONE, CACHE_DIR
+from cache import ParquetCache
 
 load_dotenv()
+DB_USER = os.getenv("POSTGRES_USER")
+DB_PASSWORD = os.getenv("POSTGRES_PASSWORD")
+DB_HOST = os.getenv("POSTGRES_HOST")
+DB_PORT = os.getenv("POSTGRES_PORT")
+DB_NAME = os.getenv("POSTGRES_DB")
+DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-@st.cache_resource(ttl=1800)
+# a day is the longest ttl load_historical_data uses, so older entries are dropped
+trends_cache = ParquetCache(CACHE_DIR / "trends", max_age=86400)
+
+@st.cache_resource
 def get_engine():
-	DB_USER = os.getenv("POSTGRES_USER")
-	DB_PASSWORD = os.getenv("POSTGRES_PASSWORD")
-	DB_HOST = os.getenv("POSTGRES_HOST")
-	DB_PORT = os.getenv("POSTGRES_PORT")
-	DB_NAME = os.getenv("POSTGRES_DB")
-	DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-	return create_engine(DATABASE_URL)
+	# one long-lived pool per process; pre-ping replaces connections the server dropped
+	return create_engine(DATABASE_URL, pool_size=5, pool_pre_ping=True)
 engine = get_engine()
 
 # -----------------
 # FUNCTIONS
 # -----------------
+def sql_literal(value) -> str:
+	"""Quote a str/date value as a SQL string literal."""
+	return "'" + str(value).replace("'", "''") + "'"
+
 @st.cache_data(ttl=1800)
 def load_historical_data(tickers, start_date, end_date):
-	placeholders = ', '.join(['%s'] * len(tickers))
+	# disk cache survives restarts; closed ranges change far less often
+	cache_key = hashlib.md5(
+		f"{sorted(tickers)}|{start_date.isoformat()}|{end_date.isoformat()}".encode()
+	).hexdigest()
+	ttl = 86400 if end_date < date.today() else 3600
+	df = trends_cache.get(cache_key, ttl=ttl)
+	if df is not None:
+		return df
+
+	# connectorx builds the frame from Arrow buffers, skipping python row tuples,
+	# but takes no bind parameters so values are rendered as quoted literals
+	ticker_list = ", ".join(sql_literal(t) for t in tickers)
 	query = f"""
 		SELECT date, ticker, close, daily_return, ingest_ts
 		FROM {STOCK_TABLE}
-		WHERE ticker IN ({placeholders})
-		  AND date BETWEEN %s AND %s
+		WHERE ticker IN ({ticker_list})
+		  AND date BETWEEN {sql_literal(start_date)} AND {sql_literal(end_date)}
 		ORDER BY date, ticker
 	"""
-	params = tuple(tickers) + (start_date, end_date)
-	with engine.connect() as conn:
-		df = pd.read_sql_query(query, conn, params=params)
+	df = cx.read_sql(DATABASE_URL, query, return_type="pandas")
+	df["ingest_ts"] = df["ingest_ts"].dt.tz_localize("UTC")  # connectorx drops the tz
+	trends_cache.set(cache_key, df)
 	return df
 
 def compute_trends(df, init_investment):
-	df = df.copy()
-	df["daily_return"] = df["daily_return"].fillna(0)
-	df["daily_return"] = 1 + df["daily_return"]
-	df["cumulative_return"] = df.groupby("ticker")["daily_return"].cumprod()
-	df["abs_return"] = init_investment * df["cumulative_return"]
-	return df
-
-def compute_final_returns(df):
-	final_df = (
-		df.groupby("ticker", as_index=False)
-		  .agg({
-			  'cumulative_return': 'last',
-			  'ingest_ts': 'max'
-			})
-		  .rename(columns={
-              'cumulative_return': 'final_return',
-              'ingest_ts': 'last_ingested'
-          })
+	df = df.sort_values(["ticker", "date"], ignore_index=True)
+	tickers = df["ticker"].to_numpy()
+	boundaries = np.flatnonzero(np.r_[True, tickers[1:] != tickers[:-1]])
+	ends = np.r_[boundaries[1:], len(tickers)]
+
+	# cumulative product of (1 + daily return) within each contiguous ticker slice
+	vals = 1.0 + np.nan_to_num(df["daily_return"].to_numpy(dtype=float))
+	for start, end in zip(boundaries, ends):
+		np.multiply.accumulate(vals[start:end], out=vals[start:end])
+
+	# the last element of each slice is that ticker's final return
+	final_returns = dict(zip(tickers[boundaries], vals[ends - 1])) if len(vals) else {}
+
+	trends_df = df.assign(
+		cumulative_return=vals,
+		abs_return=vals * init_investment,
 	)
-	return final_df
-
-def compute_relative_returns(df, base_ticker, comp_ticker):
-	base = df[df['ticker'] == base_ticker][['date', 'cumulative_return']]
-	comp = df[df['ticker'] == comp_ticker][['date', 'cumulative_return']]
-	merged = base.merge(comp, on='date', suffixes=('_base', '_comp'))
-	merged['pct_diff'] = 100 * (merged['cumulative_return_base'] - merged['cumulative_return_comp'])
-	return merged
-
-@st.cache_data
-def get_sp500_info():
-	query = f"""
-		With cte AS (
-		  	SELECT sp500.ticker_symbol, sp500.security_name, 
-			   sp500.gics_sector, st.daily_return, st.date,
-			   ROW_NUMBER() OVER(
-				 PARTITION BY sp500.ticker_symbol
-				 ORDER BY st.date DESC
-			   ) AS row_num
+	return trends_df, final_returns
+
+def compute_relative_returns(df, base_tickers, comp_ticker):
+	wide = df.pivot(index="date", columns="ticker", values="cumulative_return")
+	base = [t for t in dict.fromkeys(base_tickers) if t in wide.columns and t != comp_ticker]
+	if comp_ticker not in wide.columns or not base:
+		return pd.DataFrame(columns=["date", "ticker", "pct_diff", "hover"])
+
+	# every base ticker against the comparison in one vectorized pass
+	pct_diff = wide[base].sub(wide[comp_ticker], axis=0).mul(100)
+	rel_df = (
+		pct_diff.reset_index()
+		  .melt(id_vars="date", var_name="ticker", value_name="pct_diff")
+		  .dropna(subset=["pct_diff"])
+	)
+	rel_df["hover"] = (
+		"<b>" + rel_df["ticker"] + "</b><br>Date: " + rel_df["date"].dt.strftime("%Y-%m-%d")
+		+ "<br>Return: " + np.char.mod("%.2f", rel_df["pct_diff"].to_numpy())
+	)
+	return rel_df
+
+@cache
+def top_movers_query(order):
+	"""Build the get_sp500_info statement once per sort order."""
+	direction = {"asc": "ASC", "desc": "DESC"}[order]
+	return text(f"""
+		WITH latest AS (
+			SELECT sp500.ticker_symbol, sp500.security_name,
+			   sp500.gics_sector, st.daily_return,
+			   ROW_NUMBER() OVER(ORDER BY st.daily_return DESC NULLS LAST) AS rank
 			FROM sp500_companies sp500
-			JOIN {STOCK_TABLE} st ON sp500.ticker_symbol = st.ticker
+			CROSS JOIN LATERAL (
+				SELECT daily_return
+				FROM {STOCK_TABLE}
+				WHERE ticker = sp500.ticker_symbol
+				ORDER BY date DESC
+				LIMIT 1
+			) st
 		)
 
-		SELECT ticker_symbol, security_name, gics_sector, daily_return
-		FROM cte
-		WHERE row_num = 1
-		ORDER BY daily_return DESC;
-	"""
+		SELECT rank, ticker_symbol, security_name, gics_sector, daily_return
+		FROM latest
+		WHERE (:sector IS NULL OR gics_sector = :sector)
+		ORDER BY daily_return {direction} NULLS LAST
+		LIMIT :n;
+	""")
+
+@st.cache_data(ttl=1800)
+def get_sp500_info(sector=None, order="desc", n=20):
+	"""Top `n` companies by latest daily return, optionally within one sector."""
 	with engine.connect() as conn:
-		sp500_df = pd.read_sql_query(query, conn)
+		sp500_df = pd.read_sql_query(
+			top_movers_query(order), conn, params={"sector": sector, "n": n}
+		)
+	sp500_df = sp500_df.set_index("rank").rename_axis(None)
 	sp500_df.columns = ["Ticker", "Name", "Sector", "Return Today"]
 	return sp500_df
 
+@st.cache_data(ttl=3600)
+def get_sectors():
+	"""Number of companies per GICS sector, for the sector filter."""
+	query = """
+		SELECT gics_sector, COUNT(*) AS n_companies
+		FROM sp500_companies
+		GROUP BY gics_sector
+		ORDER BY gics_sector;
+	"""
+	with engine.connect() as conn:
+		sectors_df = pd.read_sql_query(query, conn)
+	return dict(zip(sectors_df["gics_sector"], sectors_df["n_companies"].tolist()))
+
 @st.cache_data(ttl=3600)
 def get_ticker_map():
-	sp500_df = get_sp500_info()
-	return dict(zip(sp500_df["Ticker"], sp500_df["Name"]))
+	query = "SELECT ticker_symbol, security_name FROM sp500_companies;"
+	with engine.connect() as conn:
+		sp500_df = pd.read_sql_query(query, conn)
+	return dict(zip(sp500_df["ticker_symbol"], sp500_df["security_name"]))
 
 ticker_map = get_ticker_map()
 
@@ -129,21 +191,20 @@ with overview_tab:
 		else: color = "#31333f"
 		return f"color: {color}"
 	
-	sp500_info = get_sp500_info()
-	sp500_info.index += 1
+	sectors = get_sectors()
 	sectors_filter = st.selectbox(
 		label="Sector Filter", 
-		options=["🌟 All"] + sp500_info["Sector"].unique().tolist()
+		options=["🌟 All"] + list(sectors)
 	)
 
 	if sectors_filter != "🌟 All":
-		sector_df = sp500_info[sp500_info["Sector"] == sectors_filter]
+		sector, n_companies = sectors_filter, sectors[sectors_filter]
 	else:
-		sector_df = sp500_info
+		sector, n_companies = None, sum(sectors.values())
 
-	top_n = min(len(sector_df) // 2, 20)
-	top_gainers = sector_df.sort_values(by="Return Today", ascending=False).head(top_n)
-	top_losers = sector_df.sort_values(by="Return Today", ascending=True).head(top_n)
+	top_n = min(n_companies // 2, 20)
+	top_gainers = get_sp500_info(sector, "desc", top_n)
+	top_losers = get_sp500_info(sector, "asc", top_n)
 	top_gainers["Return Today"] = top_gainers["Return Today"].apply(format_daily_return)
 	top_losers["Return Today"] = top_losers["Return Today"].apply(format_daily_return)
 
@@ -191,12 +252,11 @@ with compare_tab:
 		st.stop()
 
 	# 1. return graph
-	base_comp = tickers_input
-	base_comp.append(comp_ticker)
+	# copy rather than append to the widget's list, which persists across reruns
+	base_comp = [*tickers_input, comp_ticker] if comp_ticker not in tickers_input else list(tickers_input)
 	
 	hist_df = load_historical_data(base_comp, dates[0], dates[1])
-	trends_df = compute_trends(hist_df, investment_input)
-	fin_returns_df = compute_final_returns(trends_df)
+	trends_df, final_returns = compute_trends(hist_df, investment_input)
 
 	if trends_df.empty:
 		st.warning("No data found.")
@@ -204,12 +264,12 @@ with compare_tab:
 		st.subheader(f"${investment_input:,} Invested in These Stocks is Now...")
 		
 		line = " | ".join(
-			f"**{ticker}:** \${investment_input * (1 + (fin_returns_df.loc[fin_returns_df['ticker']==ticker]['final_return'].values[0])):,.2f}"
-			for ticker in base_comp
+			f"**{ticker}:** \${investment_input * (1 + final_returns[ticker]):,.2f}"
+			for ticker in base_comp if ticker in final_returns
 		)
 		st.markdown(line)
 
-		last_updated = fin_returns_df['last_ingested'].iloc[0]
+		last_updated = trends_df['ingest_ts'].max()
 		last_updated_loc = last_updated.tz_convert(TIME_ZONE)
 		st.caption(f"Last updated: {last_updated_loc:%Y-%m-%d %I:%M %p}")
 
@@ -238,20 +298,13 @@ with compare_tab:
 	if not tickers_input:
 		st.warning("No base ticker(s) selected")
 
-	for ticker in tickers_input:
-		if ticker == comp_ticker: continue
-
-		rel_df = compute_relative_returns(trends_df, ticker, comp_ticker)
+	rel_returns_df = compute_relative_returns(trends_df, tickers_input, comp_ticker)
+	for ticker, rel_df in rel_returns_df.groupby("ticker", sort=False):
 		fig = go.Figure()
 
 		fin_rel_return = rel_df['pct_diff'].iloc[-1]
 		fin_color = "#ff4b4b" if fin_rel_return < 0 else "#1ed760"
 
-		hover_text = [
-			f"<b>{ticker}</b><br>Date: {d:%Y-%m-%d}<br>Return: {r:.2f}"
-			for d, r in zip(rel_df['date'], rel_df['pct_diff'])
-		]
-		
 		fig.add_trace(
 			go.Scatter(
 				x=rel_df["date"],
@@ -260,7 +313,7 @@ with compare_tab:
 				line=dict(color=fin_color, width=2),
 				showlegend=False,
 				hoverinfo="text",
-				text=hover_text
+				text=rel_df["hover"]
 			)
 		)
 
@@ -272,11 +325,8 @@ with compare_tab:
 			),
 			xaxis_title=None,
 			yaxis_title="Return (pp)",
-			height=330
-		)
-
-		# highlight 0% gridline
-		fig.update_layout(
+			height=330,
+			# highlight 0% gridline
 			shapes=[dict(
 				type="line",
 				x0=rel_df['date'].min(), x1=rel_df['date'].max(),
@@ -0,0 +1,98 @@
+"""
+File Cache
+Small persistent cache for expensive lookups shared across pipeline runs.
+"""
+
+import os
+import pickle
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+
+class FileCache:
+	"""Pickle-backed key/value store under a cache directory, expired by file age."""
+
+	suffix = ".pkl"
+
+	def __init__(self, cache_dir: Path, max_age: Optional[float] = None):
+		self.cache_dir = Path(cache_dir)
+		# entries older than max_age seconds are deleted rather than kept as stale fallbacks
+		self.max_age = max_age
+
+	def _path(self, key: str) -> Path:
+		return self.cache_dir / f"{key}{self.suffix}"
+
+	def _dump(self, value: Any, f):
+		pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+	def _load(self, f) -> Any:
+		return pickle.load(f)
+
+	def _unlink(self, path: Path):
+		try:
+			path.unlink()
+		except OSError:
+			pass
+
+	def get(self, key: str, ttl: Optional[float] = None) -> Optional[Any]:
+		"""Return the cached value, or None if missing, unreadable or older than `ttl` seconds."""
+		path = self._path(key)
+		try:
+			age = time.time() - path.stat().st_mtime
+		except OSError:
+			return None
+
+		if self.max_age is not None and age > self.max_age:
+			self._unlink(path)
+			return None
+		if ttl is not None and age > ttl:
+			return None
+
+		try:
+			with open(path, "rb") as f:
+				return self._load(f)
+		except Exception:
+			# any failure to load (corrupt file, library upgrade) is a cache miss
+			self._unlink(path)
+			return None
+
+	def set(self, key: str, value: Any):
+		"""Atomically write a value so concurrent readers never see a partial file."""
+		path = self._path(key)
+		path.parent.mkdir(parents=True, exist_ok=True)
+		fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+		try:
+			with os.fdopen(fd, "wb") as f:
+				self._dump(value, f)
+			os.replace(tmp_path, path)
+		except BaseException:
+			os.unlink(tmp_path)
+			raise
+		self.prune()
+
+	def prune(self):
+		"""Delete entries older than max_age."""
+		if self.max_age is None:
+			return
+		cutoff = time.time() - self.max_age
+		for path in self.cache_dir.glob(f"*{self.suffix}"):
+			try:
+				if path.stat().st_mtime < cutoff:
+					path.unlink()
+			except OSError:
+				pass
+
+
+class ParquetCache(FileCache):
+	"""FileCache for pandas DataFrames, stored as Parquet so entries outlive library upgrades."""
+
+	suffix = ".parquet"
+
+	def _dump(self, value: Any, f):
+		value.to_parquet(f)
+
+	def _load(self, f) -> Any:
+		import pandas as pd
+		return pd.read_parquet(f)
@@ -1,23 +1,32 @@
 from datetime import datetime, timezone
+from functools import cache
 from pathlib import Path
-import requests 
+import requests
 from bs4 import BeautifulSoup
 import pytz
 
-def get_sp500_tickers():
+from cache import FileCache
+
+DAGS_DIR = Path(__file__).parent
+PROJECT_ROOT = DAGS_DIR.parent
+CACHE_DIR = PROJECT_ROOT / ".cache"
+SP500_CACHE_TTL = 24 * 60 * 60  # seconds
+
+def fetch_sp500_tickers():
 	url = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
-	headers = { 
+	headers = {
 		"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
 		"AppleWebKit/537.36 (KHTML, like Gecko) "
 		"Chrome/115.0 Safari/537.36"
 	}
 
 	html_doc = requests.get(url, headers=headers)
+	html_doc.raise_for_status()
 	soup = BeautifulSoup(html_doc.text, "html.parser")
 
 	table = soup.find("table", id="constituents")
 	sp500_data = []
-	
+
 	for row in table.find_all("tr")[1:]:
 		cols = row.find_all("td")
 		if cols:
@@ -31,16 +40,42 @@ def get_sp500_tickers():
 
 	return sp500_data
 
-SP500_INFO = get_sp500_tickers()
-TICKERS = [t[0] for t in SP500_INFO]
+@cache
+def get_sp500_tickers():
+	"""Get S&P 500 constituents, scraping Wikipedia only when the disk cache is stale."""
+	file_cache = FileCache(CACHE_DIR)
+	sp500_data = file_cache.get("sp500_constituents", ttl=SP500_CACHE_TTL)
+	if sp500_data is not None:
+		return sp500_data
+
+	try:
+		sp500_data = fetch_sp500_tickers()
+	except requests.RequestException:
+		# fall back to the last good scrape rather than failing the run
+		sp500_data = file_cache.get("sp500_constituents")
+		if sp500_data is None:
+			raise
+		return sp500_data
+
+	file_cache.set("sp500_constituents", sp500_data)
+	return sp500_data
+
+def __getattr__(name):
+	# SP500_INFO and TICKERS are resolved on first access so that importing
+	# config for plain constants never touches the network or the cache
+	if name == "SP500_INFO":
+		return get_sp500_tickers()
+	if name == "TICKERS":
+		return [t[0] for t in get_sp500_tickers()]
+	raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 BACKFILL_START_DATE = "2005-01-01"
 AN_START_DATE = "2020-01-01"
 END_DATE = datetime.now(timezone.utc).strftime("%Y-%m-%d")
 ROLLING_WINDOW = 30  # days for volatility
+YF_CHUNK_SIZE = 50  # tickers per yfinance download
+YF_THREADS = 10  # concurrent requests within a download
 
-DAGS_DIR = Path(__file__).parent
-PROJECT_ROOT = DAGS_DIR.parent
 STOCK_TABLE = "stock_metrics"
 
 TIME_ZONE = pytz.timezone("US/Eastern")
@@ -3,11 +3,8 @@ Backfill Ingestion
 Fetches all historical data for the ETFs up to today
 """
 
-import io
-import boto3
 import sys
 import logging
-import yfinance as yf
 import polars as pl
 from datetime import datetime, timezone
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -15,9 +12,8 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 # -----------------
 # CONFIG
 # -----------------
-from config import TICKERS, BACKFILL_START_DATE, END_DATE
-s3_client = boto3.client("s3")
-s3_resource = boto3.resource("s3")
+from config import TICKERS, BACKFILL_START_DATE, END_DATE, YF_CHUNK_SIZE, YF_THREADS
+from storage import upload_to_s3, yf_download_to_polars
 
 # -----------------
 # LOGGING
@@ -32,28 +28,33 @@ logging.basicConfig(
 # FUNCTIONS
 # -----------------
 def fetch_historical_data(tickers: list[str], start: str, end: str) -> pl.DataFrame:
-	"""Fetch historical data for a list of tickers."""
-	df_pd = yf.download(tickers, start=start, end=end, auto_adjust=True)
-	if df_pd.empty:
-		logging.warning(f"No data returned for {tickers}")
+	"""Fetch historical data for a list of tickers, one chunk of tickers at a time."""
+	import yfinance as yf  # heavy import, only needed on this path
+
+	frames = []
+	for i in range(0, len(tickers), YF_CHUNK_SIZE):
+		# yf.download keeps module-level state, so chunks run one after another
+		# and the per-ticker requests inside a chunk are spread over threads
+		chunk = tickers[i:i + YF_CHUNK_SIZE]
+		df_pd = yf.download(
+			chunk, start=start, end=end, auto_adjust=True,
+			group_by="ticker", threads=YF_THREADS
+		)
+		if df_pd.empty:
+			logging.warning(f"No data returned for {chunk}")
+			continue
+
+		frames.append(yf_download_to_polars(df_pd))
+
+	frames = [frame for frame in frames if not frame.is_empty()]
+	if not frames:
 		return pl.DataFrame()
-	
-	df_pd = df_pd.stack(level=1).rename_axis(["Date", "Ticker"]).reset_index()
-	df_pd.columns = [str.lower(col) for col in df_pd.columns.values]
-	
-	# convert to polars df
-	df = pl.from_pandas(df_pd)
-	df = df.with_columns(ingest_ts=pl.lit(datetime.now(timezone.utc)))
-	return df
 
-def upload_partition(bucket_name: str, year: int, ticker: str, df: pl.DataFrame):
-	"""Upload a single partition to S3."""
-	buffer = io.BytesIO()
-	df.write_parquet(buffer)
-	buffer.seek(0)
-	s3_key = f"raw/{year}/{ticker}_metrics.parquet"
-	s3_client.put_object(Bucket=bucket_name, Key=s3_key, Body=buffer.getvalue())
-	return s3_key
+	df = pl.concat(frames, how="vertical_relaxed", rechunk=True)
+	df = df.with_columns(
+		ingest_ts=pl.lit(datetime.now(timezone.utc), dtype=pl.Datetime("us", "UTC"))
+	)
+	return df
 
 def save_partitioned_parquet(df: pl.DataFrame, tickers: list[str]):
 	"""Partition by year/ticker and upload in parallel."""
@@ -62,21 +63,26 @@ def save_partitioned_parquet(df: pl.DataFrame, tickers: list[str]):
 		return
 
 	bucket_name = "stock-market-etl"
-	years = list(df.select(pl.col("date").dt.year()).unique().to_series())
 
-	tasks = []
+	# split into (year, ticker) partitions in a single pass
+	df = df.filter(pl.col("ticker").is_in(tickers)).with_columns(
+		pl.col("volume").cast(pl.Int64),
+		pl.col("date").dt.year().alias("year"),
+	)
+	partitions = df.partition_by(["year", "ticker"], as_dict=True)
+
 	with ThreadPoolExecutor(max_workers=10) as executor:
-		for year in years:
-			for ticker in tickers:
-				subset_df = df.filter(
-					(pl.col("date").dt.year() == year) & (pl.col("ticker") == ticker)
-				)
-				subset_df = subset_df.with_columns(
-					pl.col("volume").cast(pl.Int64)
-				)
-				if not subset_df.is_empty():
-					tasks.append(executor.submit(upload_partition, bucket_name, year, ticker, subset_df))
-	
+		futures = [
+			executor.submit(
+				upload_to_s3, bucket_name, f"raw/{year}/{ticker}_metrics.parquet", subset_df.drop("year")
+			)
+			for (year, ticker), subset_df in partitions.items()
+		]
+		for future in as_completed(futures):
+			future.result()  # propagate exceptions
+
+	logging.info(f"Uploaded {len(partitions)} partitions to S3.")
+
 def main():
 	hist_df = fetch_historical_data(TICKERS, BACKFILL_START_DATE, END_DATE)
 	save_partitioned_parquet(hist_df, TICKERS)
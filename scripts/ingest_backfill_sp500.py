@@ -1,5 +1,4 @@
 import io
-import boto3
 import sys
 import logging
 import polars as pl
@@ -8,8 +7,7 @@ import polars as pl
 # CONFIG
 # -----------------
 from config import SP500_INFO
-s3_client = boto3.client("s3")
-s3_resource = boto3.resource("s3")
+from storage import get_s3_client
 
 
 # -----------------
@@ -44,7 +42,7 @@ def save_sp_500():
 	buffer.seek(0)
 	bucket_name = "stock-market-etl"
 	s3_key = f"info/sp500_companies.parquet"
-	s3_client.put_object(Bucket=bucket_name, Key=s3_key, Body=buffer.getvalue())
+	get_s3_client().put_object(Bucket=bucket_name, Key=s3_key, Body=buffer)
 
 	logging.info(f"Loaded S&P 500 company info into S3")
 	
@@ -4,23 +4,24 @@ Daily ETF Price Incremental Ingestion
 Fetches only new data since the last available date in Parquet storage.
 """
 
-import io
 import os
-import boto3
 from dotenv import load_dotenv
 import sys
 import logging
 import yfinance as yf
 import polars as pl
+import pyarrow.parquet as pq
 from datetime import datetime, timezone
 from typing import Optional
+from collections import defaultdict
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from sqlalchemy import create_engine
 
 # -----------------
 # CONFIG
 # -----------------
-from config import TICKERS
+from config import TICKERS, YF_THREADS
+from storage import get_s3_client, get_s3_filesystem, download_from_s3, upload_to_s3, yf_download_to_polars
 
 load_dotenv()
 DB_USER = os.getenv("POSTGRES_USER")
@@ -29,9 +30,6 @@ DB_HOST = os.getenv("POSTGRES_HOST")
 DB_PORT = os.getenv("POSTGRES_PORT")
 DB_NAME = os.getenv("POSTGRES_DB")
 
-s3_client = boto3.client("s3")
-s3_resource = boto3.resource("s3")
-
 # -----------------
 # LOGGING
 # -----------------
@@ -52,39 +50,61 @@ def get_latest_ingest_timestamp(engine) -> Optional[datetime]:
 		res = conn.execute(query).fetchone()[0]
 		return res
 
+def read_max_date(bucket_name: str, key: str) -> Optional[datetime]:
+	"""Read the latest date stored in a single raw partition."""
+	# partitions are written with column statistics, so the footer alone has the max
+	metadata = pq.read_metadata(f"{bucket_name}/{key}", filesystem=get_s3_filesystem())
+	date_idx = metadata.schema.names.index("date")
+	stats = [metadata.row_group(i).column(date_idx).statistics for i in range(metadata.num_row_groups)]
+	if stats and all(s is not None and s.has_min_max for s in stats):
+		# Arrow hands ns statistics back as pandas Timestamps; Polars' max returns a plain datetime
+		return pl.Series([s.max for s in stats]).max()
+
+	# keys come from a listing so they exist; scanning range-reads only the date column
+	lf = pl.scan_parquet(f"s3://{bucket_name}/{key}")
+	return lf.select(pl.col("date").max()).collect().item()
+
+def get_latest_ingest_date(bucket_name: str) -> Optional[datetime]:
+	"""Get the most recent date available in the raw Parquet partitions on S3."""
+	# keys are raw/{year}/{ticker}_metrics.parquet, so the year comes from the key
+	# and only the newest year's partitions need to be opened
+	paginator = get_s3_client().get_paginator("list_objects_v2")
+	keys_by_year = defaultdict(list)
+	for page in paginator.paginate(Bucket=bucket_name, Prefix="raw/"):
+		for obj in page.get("Contents", []):
+			year = obj["Key"].split("/")[1]
+			if year.isdigit():
+				keys_by_year[int(year)].append(obj["Key"])
+
+	if not keys_by_year:
+		return None
+
+	latest_keys = keys_by_year[max(keys_by_year)]
+	with ThreadPoolExecutor(max_workers=32) as executor:
+		max_dates = executor.map(lambda key: read_max_date(bucket_name, key), latest_keys)
+		max_dates = [d for d in max_dates if d is not None]
+	return max(max_dates, default=None)
+
 def fetch_incremental_data(tickers: list[str], start: datetime, end: datetime) -> pl.DataFrame:
 	logging.info(f"Fetching ticker data from {start.date()} to {end.date()} ")
 
-	df_pd = yf.download(tickers, start=start, end=end, auto_adjust=True)
+	# yf.download already fetches each ticker's history on its own thread
+	df_pd = yf.download(
+		tickers, start=start, end=end, auto_adjust=True,
+		group_by="ticker", threads=YF_THREADS
+	)
 	if df_pd.empty:
 		logging.warning(f"No data returned for {tickers}")
 		return pl.DataFrame()
-	
-	df_pd = df_pd.stack(level=1).rename_axis(["Date", "Ticker"]).reset_index()
-	df_pd.columns = [str.lower(col) for col in df_pd.columns.values]
 
-	# convert to polars df
-	df = pl.from_pandas(df_pd)
-	df = df.with_columns(ingest_ts=pl.lit(datetime.now(timezone.utc)))
-	return df
+	df = yf_download_to_polars(df_pd)
+	if df.is_empty():
+		return df
 
-def download_from_s3(bucket_name: str, key: str) -> tuple[str, pl.DataFrame]:
-	"""Download a Parquet file from S3 and return DataFrame."""
-	try:
-		obj = s3_client.get_object(Bucket=bucket_name, Key=key)
-		buffer = io.BytesIO(obj["Body"].read())
-		df = pl.read_parquet(buffer)
-		return key, df
-	except s3_client.exceptions.NoSuchKey:
-		return key, pl.DataFrame()
-
-def upload_to_s3(bucket_name: str, key: str, df: pl.DataFrame):
-	"""Upload a DataFrame as Parquet to S3."""
-	buffer = io.BytesIO()
-	df.write_parquet(buffer)
-	buffer.seek(0)
-	s3_client.put_object(Bucket=bucket_name, Key=key, Body=buffer.getvalue())
-	return key
+	df = df.with_columns(
+		ingest_ts=pl.lit(datetime.now(timezone.utc), dtype=pl.Datetime("us", "UTC"))
+	)
+	return df
 
 def save_partitioned_parquet(df: pl.DataFrame, tickers: list[str]):
 	"""
@@ -96,39 +116,36 @@ def save_partitioned_parquet(df: pl.DataFrame, tickers: list[str]):
 		return
 
 	bucket_name = "stock-market-etl"
-	years = list(df.select(pl.col("date").dt.year()).unique().to_series())
 
-	# build list of all keys to read
-	keys_to_read = [
-		f"raw/{year}/{ticker}_metrics.parquet"
-		for year in years
-		for ticker in tickers
-	]
-
-	# parallel read from S3
+	# split new data into (year, ticker) partitions in a single pass
+	partitions = df.filter(pl.col("ticker").is_in(tickers)).with_columns(
+		pl.col("volume").cast(pl.Int64),
+		pl.col("date").dt.year().alias("year"),
+	).partition_by(["year", "ticker"], as_dict=True)
+	new_data = {
+		f"raw/{year}/{ticker}_metrics.parquet": subset_df.drop("year")
+		for (year, ticker), subset_df in partitions.items()
+	}
+
+	# parallel read from S3, only for partitions that have new rows
 	existing_data = {}
 	with ThreadPoolExecutor(max_workers=10) as executor:
-		futures = {executor.submit(download_from_s3, bucket_name, key): key for key in keys_to_read}
+		futures = {executor.submit(download_from_s3, bucket_name, key): key for key in new_data}
 		for future in as_completed(futures):
 			key, existing_df = future.result()
 			existing_data[key] = existing_df
 
 	# merge with new data
 	merged_data = {}
-	for year in years:
-		for ticker in tickers:
-			key = f"raw/{year}/{ticker}_metrics.parquet"
-			
-			subset_df = df.with_columns(pl.col("volume").cast(pl.Int64)).filter(
-				(pl.col("date").dt.year() == year) & (pl.col("ticker") == ticker)
-			)
-
-			if subset_df.is_empty(): continue 
+	for key, subset_df in new_data.items():
+		existing_df = existing_data[key]
+		if existing_df.is_empty():
+			merged_data[key] = subset_df
+			continue
 
-			today = subset_df.select(pl.col("date")).unique().to_series()[0]
-			existing_df = existing_data[key].filter(pl.col("date") != today)
-			combined_df = pl.concat([existing_df, subset_df], how="vertical")
-			merged_data[key] = combined_df
+		# fetched rows replace any stored rows for the same dates
+		existing_df = existing_df.join(subset_df.select("date", "ticker"), on=["date", "ticker"], how="anti")
+		merged_data[key] = pl.concat([existing_df, subset_df], how="vertical")
 
 	# parallel write back to S3
 	with ThreadPoolExecutor(max_workers=10) as executor:
@@ -142,9 +159,15 @@ def main():
 	postgres_url=f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 	engine = create_engine(postgres_url)
 
+	# Postgres is empty until the first load after a backfill, so fall back to S3
+	bucket_name = "stock-market-etl"
+	start_ts = get_latest_ingest_timestamp(engine) or get_latest_ingest_date(bucket_name)
+	if start_ts is None:
+		logging.warning("No ingested data found in Postgres or S3; run the backfill first.")
+		return
+
 	now = datetime.now()
-	start_ts, end_ts = get_latest_ingest_timestamp(engine), now
-	df_new = fetch_incremental_data(TICKERS, start_ts, end_ts)
+	df_new = fetch_incremental_data(TICKERS, start_ts, now)
 	save_partitioned_parquet(df_new, TICKERS)
 	logging.info("Daily incremental ingestion complete.")
 
@@ -1,7 +1,6 @@
 import os
 import io
 import sys
-import boto3
 from dotenv import load_dotenv
 import polars as pl
 import logging
@@ -10,7 +9,8 @@ from sqlalchemy import create_engine, text
 # -----------------
 # CONFIG
 # -----------------
-from config import TICKERS, STOCK_TABLE
+from config import STOCK_TABLE
+from storage import get_s3_client
 
 load_dotenv()
 DB_USER = os.getenv("POSTGRES_USER")
@@ -19,9 +19,6 @@ DB_HOST = os.getenv("POSTGRES_HOST")
 DB_PORT = os.getenv("POSTGRES_PORT")
 DB_NAME = os.getenv("POSTGRES_DB")
 
-s3_client = boto3.client("s3")
-s3_resource = boto3.resource("s3")
-
 # -----------------
 # LOGGING
 # -----------------
@@ -40,7 +37,7 @@ def load_to_sp500_companies(companies_table, engine):
 	bucket_name = "stock-market-etl"
 	s3_key = f"info/sp500_companies.parquet"
 
-	body = s3_resource.Object(bucket_name, s3_key).get()['Body'].read()
+	body = get_s3_client().get_object(Bucket=bucket_name, Key=s3_key)['Body'].read()
 	buffer = io.BytesIO(body)
 	df = pl.read_parquet(buffer)
 
@@ -1,7 +1,6 @@
 import os
 import io
 import sys
-import boto3
 from dotenv import load_dotenv
 from datetime import date, datetime
 import polars as pl
@@ -13,6 +12,7 @@ from transform import get_latest_ingest_year
 # CONFIG
 # -----------------
 from config import TICKERS, STOCK_TABLE, BACKFILL_START_DATE
+from storage import get_s3_client
 
 load_dotenv()
 DB_USER = os.getenv("POSTGRES_USER")
@@ -21,8 +21,7 @@ DB_HOST = os.getenv("POSTGRES_HOST")
 DB_PORT = os.getenv("POSTGRES_PORT")
 DB_NAME = os.getenv("POSTGRES_DB")
 
-s3_client = boto3.client("s3")
-s3_resource = boto3.resource("s3")
+COPY_BATCH_ROWS = 10_000
 
 # -----------------
 # LOGGING
@@ -39,57 +38,83 @@ logging.basicConfig(
 
 def get_latest_dates(table_name: str, engine) -> pl.DataFrame:
 	"""Get latest date in DB per ticker"""
-	query = f"""
+	query = text(f"""
 		SELECT ticker, MAX(date) AS latest_date
 		FROM {table_name}
 		GROUP BY ticker
-	"""
+	""")
+	# one row per ticker, so the SQLAlchemy connection the loader already holds is enough
 	with engine.connect() as conn:
-		res = pl.DataFrame(conn.execute(query).fetchall())
-	return pl.DataFrame(res, schema=["ticker", "latest_date"])
+		return pl.read_database(query, conn)
+
+def copy_to_table(df: pl.DataFrame, table_name: str, conn, batch_size: int = COPY_BATCH_ROWS):
+	"""Bulk load a DataFrame into an existing table with COPY, one batch of rows at a time."""
+	columns = ", ".join(f'"{col}"' for col in df.columns)
+	copy_sql = f"COPY {table_name} ({columns}) FROM STDIN WITH (FORMAT CSV)"
+
+	# batching bounds the CSV buffer on backfill-sized loads
+	with conn.connection.cursor() as cur:
+		for batch in df.iter_slices(n_rows=batch_size):
+			buffer = io.BytesIO()
+			batch.write_csv(buffer, include_header=False)
+			buffer.seek(0)
+			cur.copy_expert(copy_sql, buffer)
+
+def upsert_to_table(df: pl.DataFrame, table_name: str, conn):
+	"""COPY into a temp staging table, then merge on (ticker, date) so reloaded rows replace old ones."""
+	stage_table = f"{table_name}_stage"
+	conn.execute(text(f"CREATE TEMP TABLE {stage_table} (LIKE {table_name} INCLUDING DEFAULTS) ON COMMIT DROP"))
+	copy_to_table(df, stage_table, conn)
+
+	columns = ", ".join(f'"{col}"' for col in df.columns)
+	updates = ", ".join(f'"{col}" = EXCLUDED."{col}"' for col in df.columns if col not in ("ticker", "date"))
+	conn.execute(text(f"""
+		INSERT INTO {table_name} ({columns})
+		SELECT {columns} FROM {stage_table}
+		ON CONFLICT (ticker, date) DO UPDATE SET {updates}
+	"""))
 
 def load_to_stock_metrics(table_name: str, years: list[str], tickers: list[str], latest_dates: pl.DataFrame, engine):
 	"""Load stock metrics from parquet file into Postgres table."""
 	bucket_name = "stock-market-etl"
-	dataframes = []
+	s3_client = get_s3_client()
+
+	# scan_parquet errors on a glob with no matches, so keep only years that have objects
+	prefixes = [f"enriched/{year}/" for year in years]
+	prefixes = [
+		prefix for prefix in prefixes
+		if s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix, MaxKeys=1)["KeyCount"] > 0
+	]
+	if not prefixes:
+		logging.info(f"No new stock metrics to load for this run.")
+		return
+	sources = [f"s3://{bucket_name}/{prefix}*.parquet" for prefix in prefixes]
 
-	today = date.today()
-	with engine.begin() as conn:  # auto commit
-		conn.execute(
-			text("DELETE FROM stock_metrics WHERE date = :today"),
-			{"today": today}
+	# one lazy scan over every year instead of a GET per year x ticker
+	lf = pl.scan_parquet(sources, missing_columns="insert", extra_columns="ignore")
+	lf = lf.filter(pl.col("ticker").is_in(tickers))
+
+	# skip rows already loaded, but keep each ticker's latest date so intraday updates are reloaded
+	if latest_dates.height > 0:
+		# once every ticker has rows, a plain date bound is pushed into the scan so
+		# row groups entirely before the oldest latest date are skipped on their statistics
+		if set(tickers) <= set(latest_dates["ticker"]):
+			lf = lf.filter(pl.col("date") >= latest_dates["latest_date"].min())
+		lf = lf.join(latest_dates.lazy(), on="ticker", how="left").filter(
+			(pl.col("latest_date").is_null()) | (pl.col("date") >= pl.col("latest_date"))
 		)
 
-	for year in years:
-		for ticker in tickers:
-			s3_key = f"enriched/{year}/{ticker}_metrics.parquet"
-			try:
-				body = s3_resource.Object(bucket_name, s3_key).get()['Body'].read()
-			except s3_client.exceptions.NoSuchKey:
-				continue
-	
-			df = pl.read_parquet(io.BytesIO(body))
-			if df.is_empty(): 
-				continue
-
-			# filter out duplicates
-			if latest_dates.height > 0:
-				df = df.join(latest_dates, on="ticker", how="left")
-				df = df.filter(
-					(pl.col("latest_date").is_null()) | (pl.col("date") > pl.col("latest_date"))
-				)
-			
-			df = df.select([col for col in df.columns if col not in ["latest_date", "adj close"]])
-			if not df.is_empty():
-				dataframes.append(df)
-	
-	if dataframes:
-		merged_df = pl.concat(dataframes, how="vertical")
-		merged_df = merged_df.unique(subset=["ticker", "date"])
-		merged_df.write_database(table_name, engine, if_table_exists='append')
-		logging.info(f"Loaded {len(merged_df)} new rows into {table_name}.")
-	else:
+	lf = lf.drop(["latest_date", "adj close"], strict=False).unique(subset=["ticker", "date"])
+	merged_df = lf.collect(engine="streaming")
+
+	if merged_df.is_empty():
 		logging.info(f"No new stock metrics to load for this run.")
+		return
+
+	with engine.begin() as conn:  # staging + merge commit together
+		conn.execute(text("SET LOCAL synchronous_commit TO OFF"))
+		upsert_to_table(merged_df, table_name, conn)
+	logging.info(f"Loaded {len(merged_df)} rows into {table_name}.")
 
 def main():
 	postgres_url=f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
@@ -0,0 +1,75 @@
+import os
+import sys
+from dotenv import load_dotenv
+import logging
+from sqlalchemy import create_engine, text
+
+# -----------------
+# CONFIG
+# -----------------
+from config import PROJECT_ROOT, STOCK_TABLE
+
+load_dotenv()
+DB_USER = os.getenv("POSTGRES_USER")
+DB_PASSWORD = os.getenv("POSTGRES_PASSWORD")
+DB_HOST = os.getenv("POSTGRES_HOST")
+DB_PORT = os.getenv("POSTGRES_PORT")
+DB_NAME = os.getenv("POSTGRES_DB")
+
+MIGRATION_FILE = PROJECT_ROOT / "sql" / "stock_metrics.sql"
+UNIQUE_INDEX = f"{STOCK_TABLE}_ticker_date_key"
+
+# -----------------
+# LOGGING
+# -----------------
+logging.basicConfig(
+	level=logging.INFO,
+	format="%(asctime)s | %(levelname)s | %(message)s",
+	handlers=[logging.StreamHandler(sys.stdout)],
+)
+
+# -----------------
+# FUNCTIONS
+# -----------------
+
+def read_statements(path) -> list[str]:
+	"""Split a migration file into statements, dropping comment lines."""
+	lines = [line for line in path.read_text().splitlines() if not line.lstrip().startswith("--")]
+	return [stmt.strip() for stmt in "\n".join(lines).split(";") if stmt.strip()]
+
+def apply_migration(path, engine):
+	"""Run each statement on its own, since CREATE INDEX CONCURRENTLY refuses a transaction block."""
+	with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+		for stmt in read_statements(path):
+			conn.execute(text(stmt))
+
+def check_unique_index(index_name: str, engine):
+	"""Fail with a clear message if the upsert key is missing or left INVALID by a failed build."""
+	query = text("""
+		SELECT i.indisvalid
+		FROM pg_index i
+		JOIN pg_class c ON c.oid = i.indexrelid
+		WHERE c.relname = :index_name
+	""")
+	with engine.connect() as conn:
+		is_valid = conn.execute(query, {"index_name": index_name}).scalar()
+
+	if is_valid is None:
+		raise RuntimeError(f"Unique index {index_name} is missing; apply {MIGRATION_FILE.name}.")
+	if not is_valid:
+		raise RuntimeError(
+			f"Unique index {index_name} is INVALID. Remove duplicate (ticker, date) rows, "
+			f"run DROP INDEX CONCURRENTLY {index_name}, then re-run migrate.py."
+		)
+
+def main():
+	postgres_url=f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+	engine = create_engine(postgres_url)
+
+	logging.info(f"Applying {MIGRATION_FILE.name}")
+	apply_migration(MIGRATION_FILE, engine)
+	check_unique_index(UNIQUE_INDEX, engine)
+	logging.info(f"{STOCK_TABLE} schema is up to date.")
+
+if __name__ == "__main__":
+	main()
@@ -1,15 +1,25 @@
-import subprocess
+# stages run in this interpreter so imports, the S3 client and config are set up once
+import migrate
+import ingest_backfill_sp500
+import ingest_backfill_raw
+import load_sp500
+import ingest_hourly
+import transform
+import load_stock_metrics
 
 backfill_sp500 = True
 backfill_raw = False
 
+# every stage below queries stock_metrics, so create it and its upsert key first
+migrate.main()
+
 if backfill_sp500:
-	subprocess.run(["python", "scripts/ingest_backfill_sp500.py"], check=True)
+	ingest_backfill_sp500.main()
 	
 if backfill_raw:
-	subprocess.run(["python", "scripts/ingest_backfill_raw.py"], check=True)
+	ingest_backfill_raw.main()
 
-subprocess.run(["python", "scripts/load_sp500.py"], check=True)
-subprocess.run(["python", "scripts/ingest_hourly.py"], check=True)
-subprocess.run(["python", "scripts/transform.py"], check=True)
-subprocess.run(["python", "scripts/load_stock_metrics.py"], check=True)
\ No newline at end of file
+load_sp500.main()
+ingest_hourly.main()
+transform.main()
+load_stock_metrics.main()
\ No newline at end of file
@@ -0,0 +1,84 @@
+"""
+S3 Storage
+Shared S3 client, Parquet serialization and raw frame shaping for the pipeline scripts.
+"""
+
+import io
+from functools import cache
+import polars as pl
+
+# zstd level 3 matched level 9 on size for one year of daily bars and wrote ~1.5x faster
+PARQUET_WRITE_OPTIONS = {
+	"compression": "zstd",
+	"compression_level": 3,
+	"statistics": True,
+	"row_group_size": 1_000_000,
+}
+
+# sized to cover the widest ThreadPoolExecutor fan-out (default is 10)
+S3_MAX_POOL_CONNECTIONS = 64
+
+
+@cache
+def get_s3_client():
+	"""Build the S3 client once per process; boto3 clients are thread-safe."""
+	import boto3
+	from botocore.config import Config
+	config = Config(
+		max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+		retries={"mode": "adaptive", "max_attempts": 10},
+		tcp_keepalive=True,
+	)
+	# a private session, not boto3's shared default one, so nothing here needs a lock
+	return boto3.session.Session().client("s3", config=config)
+
+
+@cache
+def get_s3_filesystem():
+	"""Arrow S3 filesystem for footer-only reads, resolved from the default AWS config."""
+	from pyarrow import fs
+	return fs.S3FileSystem()
+
+
+def to_parquet_buffer(df: pl.DataFrame) -> io.BytesIO:
+	"""Serialize a partition to Parquet, date-sorted so row-group stats stay tight."""
+	buffer = io.BytesIO()
+	df.sort("date").write_parquet(buffer, **PARQUET_WRITE_OPTIONS)
+	buffer.seek(0)
+	return buffer
+
+
+def download_from_s3(bucket_name: str, key: str) -> tuple[str, pl.DataFrame]:
+	"""Download a Parquet file from S3 and return DataFrame."""
+	s3_client = get_s3_client()
+	try:
+		obj = s3_client.get_object(Bucket=bucket_name, Key=key)
+		buffer = io.BytesIO(obj["Body"].read())
+		df = pl.read_parquet(buffer)
+		return key, df
+	except s3_client.exceptions.NoSuchKey:
+		return key, pl.DataFrame()
+
+
+def upload_to_s3(bucket_name: str, key: str, df: pl.DataFrame):
+	"""Upload a DataFrame as Parquet to S3."""
+	buffer = to_parquet_buffer(df)
+	get_s3_client().put_object(Bucket=bucket_name, Key=key, Body=buffer)
+	return key
+
+
+def yf_download_to_polars(df_pd) -> pl.DataFrame:
+	"""Reshape a wide `yf.download(group_by="ticker")` frame into long raw rows."""
+	# slice each ticker's block out of the wide frame instead of stacking it
+	frames = []
+	for ticker in df_pd.columns.unique(level=0):
+		sub_pd = df_pd[ticker].dropna(how="all").rename_axis("date").reset_index()
+		sub_pd.columns = [col.lower() for col in sub_pd.columns]
+		sub_pd["ticker"] = ticker
+		frames.append(pl.from_pandas(sub_pd, rechunk=False))
+
+	if not frames:
+		return pl.DataFrame()
+
+	df = pl.concat(frames, how="vertical_relaxed", rechunk=True)
+	return df.select("date", "ticker", "close", "high", "low", "open", "volume")
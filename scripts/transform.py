@@ -1,8 +1,6 @@
-import io
 import os
 from dotenv import load_dotenv
-from datetime import date
-import boto3
+from datetime import date, datetime
 import sys
 import logging
 import polars as pl
@@ -12,7 +10,8 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 # -----------------
 # CONFIG
 # -----------------
-from config import TICKERS, ROLLING_WINDOW
+from config import TICKERS, ROLLING_WINDOW, BACKFILL_START_DATE
+from storage import get_s3_client, upload_to_s3
 
 load_dotenv()
 DB_USER = os.getenv("POSTGRES_USER")
@@ -21,8 +20,14 @@ DB_HOST = os.getenv("POSTGRES_HOST")
 DB_PORT = os.getenv("POSTGRES_PORT")
 DB_NAME = os.getenv("POSTGRES_DB")
 
-s3_client = boto3.client("s3")
-s3_resource = boto3.resource("s3")
+ENRICHED_SCHEMA = {
+	"date": pl.Datetime, "close": pl.Float64, "high": pl.Float64,
+	"low": pl.Float64, "open": pl.Float64, "volume": pl.Int64,
+	"ticker": pl.Utf8, "ingest_ts": pl.Datetime, "daily_return": pl.Float64,
+	"rolling_vol_30d": pl.Float64,
+}
+CRITICAL_COLUMNS = ["ticker", "date"]
+_validated_schemas = set()
 
 # -----------------
 # LOGGING
@@ -43,68 +48,67 @@ def get_latest_ingest_year(engine):
 		res = conn.execute(query).fetchone()[0]
 		return res
 
-def load_raw_df(year: str, ticker: str) -> pl.DataFrame:
-	"""Load raw parquet files from s3"""
+def load_raw_df(year: str, tickers: list[str]) -> pl.LazyFrame:
+	"""Lazily scan one year of raw parquet files from s3"""
 	bucket_name = "stock-market-etl"
-	s3_key = f"raw/{year}/{ticker}_metrics.parquet"
-	
-	try:
-		s3_obj = s3_client.get_object(Bucket=bucket_name, Key=s3_key)
-	except s3_client.exceptions.NoSuchKey:
-		return pl.DataFrame()
-	
-	buffer = io.BytesIO(s3_obj['Body'].read())
-	df = pl.read_parquet(buffer)
-	df = df.with_columns(pl.col("volume").cast(pl.Int64))
+	prefix = f"raw/{year}/"
+
+	# scan_parquet errors on a glob with no matches, so check the prefix first
+	listing = get_s3_client().list_objects_v2(Bucket=bucket_name, Prefix=prefix, MaxKeys=1)
+	if listing["KeyCount"] == 0:
+		return pl.LazyFrame()
 
-	return df
+	lf = pl.scan_parquet(f"s3://{bucket_name}/{prefix}*.parquet", missing_columns="insert", extra_columns="ignore")
+	lf = lf.filter(pl.col("ticker").is_in(tickers))
+	lf = lf.with_columns(pl.col("volume").cast(pl.Int64))
 
-def compute_metrics(df: pl.DataFrame) -> pl.DataFrame:
-	if df.is_empty(): return df
+	return lf
 
+def compute_metrics(lf: pl.LazyFrame) -> pl.DataFrame:
+	# both metrics go in one projection so they share the ticker grouping
+	daily_return = pl.col("close").pct_change()
 	q = (
-		df.lazy()
+		lf
 		.sort(["ticker", "date"]) 
 		.with_columns([
-			(pl.col("close").pct_change().over("ticker")).alias("daily_return"),
-		])
-		.with_columns([
-			pl.col("daily_return")
+			daily_return.over("ticker").alias("daily_return"),
+			daily_return
 			.rolling_std(window_size=ROLLING_WINDOW, min_samples=1)
 			.over("ticker")
 			.alias("rolling_vol_30d"),
 		])
 	)
 
-	return q.collect()
-
-def data_quality_checks(df: pl.DataFrame) -> bool:
-	expected_schema = {
-		"date": pl.Datetime, "close": pl.Float64, "high": pl.Float64,
-		"low": pl.Float64, "open": pl.Float64, "volume": pl.Int64,
-		"ticker": pl.Utf8, "ingest_ts": pl.Datetime, "daily_return": pl.Float64,
-		"rolling_vol_30d": pl.Float64,
-	}
+	return q.collect(engine="streaming")
 
+def check_schema(df: pl.DataFrame) -> bool:
 	# Check columns present
-	missing_cols = [col for col in expected_schema if col not in df.columns]
+	missing_cols = [col for col in ENRICHED_SCHEMA if col not in df.columns]
 	if missing_cols:
 		logging.error(f"Missing columns: {missing_cols}")
 		return False
 	
-	# Check column types
-	for col, expected_type in expected_schema.items():
-		if col in df.columns:
-			actual_type = df.schema[col]
-			if not isinstance(actual_type, expected_type):
-				logging.error(f"Column {col} expected type {expected_type}, found {actual_type}")
-				return False
+	# Check column types; a bare pl.Datetime compares equal to any unit/time zone
+	schema = df.schema
+	mismatched = {col: schema[col] for col, dtype in ENRICHED_SCHEMA.items() if schema[col] != dtype}
+	if mismatched:
+		logging.error(f"Unexpected column types: {mismatched}")
+		return False
+
+	return True
+
+def data_quality_checks(df: pl.DataFrame) -> bool:
+	# every ticker of a year shares one schema, so it only needs validating once
+	schema_key = tuple(df.schema.items())
+	if schema_key not in _validated_schemas:
+		if not check_schema(df):
+			return False
+		_validated_schemas.add(schema_key)
 
 	# Check for nulls in critical columns
-	crit_columns = ['ticker', 'date']
-	null_counts = df.select(pl.col(c).is_null().sum().alias(c) for c in crit_columns).to_dict(as_series=False)
+	null_counts = df.select(CRITICAL_COLUMNS).null_count().row(0, named=True)
 	for col, count in null_counts.items():
-		if count[0] > 0:
+		if count > 0:
 			logging.error(f"Null values found in column {col}: {count}")
 			return False
 	
@@ -115,37 +119,54 @@ def save_enriched_data(df: pl.DataFrame, year: str, ticker: str):
 		logging.warning(f"No data to save for {year}")
 		return
 
-	# load enriched data into s3 without local download needed
-	buffer = io.BytesIO()
-	df.write_parquet(buffer)
-	buffer.seek(0)
-
+	# same zstd, statistics-on layout as the raw partitions
 	bucket_name = "stock-market-etl"
 	s3_key = f"enriched/{year}/{ticker}_metrics.parquet"
-	s3_client.put_object(Bucket=bucket_name, Key=s3_key, Body=buffer.getvalue())
+	upload_to_s3(bucket_name, s3_key, df)
 		
-def process_ticker(year: int, ticker: str):
-	raw_df = load_raw_df(year, ticker)
-	if raw_df.is_empty():
-		return
-
-	enriched_df = compute_metrics(raw_df)
+def process_ticker(year: int, ticker: str, enriched_df: pl.DataFrame):
 	if data_quality_checks(enriched_df):
 		save_enriched_data(enriched_df, year, ticker)
 	else:
 		logging.warning(f"Data quality failed for {year}/{ticker}")
 
+def process_year(year: int) -> dict:
+	"""Compute metrics for every ticker of a year in one plan, then split them per ticker."""
+	raw_lf = load_raw_df(year, TICKERS)
+	if not raw_lf.collect_schema():
+		return {}
+
+	partitions = compute_metrics(raw_lf).partition_by("ticker", as_dict=True)
+	return {ticker: enriched_df for (ticker,), enriched_df in partitions.items()}
+
 def main():
 	postgres_url=f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 	engine = create_engine(postgres_url)
 	latest_ingest_year = get_latest_ingest_year(engine)
 
-	for year in range(latest_ingest_year, date.today().year + 1):
-		logging.info(f"Processing year {year}")
-		with ThreadPoolExecutor(max_workers=10) as executor:
-			futures = [executor.submit(process_ticker, year, ticker) for ticker in TICKERS]
-			for future in as_completed(futures):
+	# Postgres is empty until the first load after a backfill, so start from the backfill year
+	if not latest_ingest_year:
+		start_year = datetime.strptime(BACKFILL_START_DATE, "%Y-%m-%d").year
+	else:
+		start_year = latest_ingest_year
+
+	# uploads for one year run while the next year is scanned and computed;
+	# waiting on the previous batch before submitting bounds it to two years in memory
+	pending = []
+	with ThreadPoolExecutor(max_workers=10) as executor:
+		for year in range(start_year, date.today().year + 1):
+			logging.info(f"Processing year {year}")
+			partitions = process_year(year)
+
+			for future in as_completed(pending):
 				future.result()  # propagate exceptions
+			pending = [
+				executor.submit(process_ticker, year, ticker, enriched_df)
+				for ticker, enriched_df in partitions.items()
+			]
+
+		for future in as_completed(pending):
+			future.result()
 
 	logging.info(f"Saved all enriched data to S3")
 
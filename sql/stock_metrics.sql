@@ -0,0 +1,24 @@
+-- stock_metrics and the unique (ticker, date) key the loader's
+-- INSERT ... ON CONFLICT (ticker, date) merge needs. run_pipeline.py and the hourly
+-- DAG apply this through scripts/migrate.py before any stage queries the table.
+CREATE TABLE IF NOT EXISTS stock_metrics (
+	date timestamp NOT NULL,
+	ticker text NOT NULL,
+	close double precision,
+	high double precision,
+	low double precision,
+	open double precision,
+	volume bigint,
+	ingest_ts timestamptz,
+	daily_return double precision,
+	rolling_vol_30d double precision
+);
+
+-- The key also serves latest-row-per-ticker lookups (app.py's LATERAL ... ORDER BY
+-- date DESC LIMIT 1) and ticker/date range scans. CONCURRENTLY avoids locking writes
+-- and must run outside a transaction block. On an existing table, remove any
+-- duplicate (ticker, date) rows first: a failed build leaves an INVALID index that
+-- IF NOT EXISTS then skips, so drop it (DROP INDEX CONCURRENTLY
+-- stock_metrics_ticker_date_key) before re-running.
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS stock_metrics_ticker_date_key
+	ON stock_metrics (ticker, date)